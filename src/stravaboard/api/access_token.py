@@ -64,4 +64,5 @@ class AccessTokenManager:
         access_token = res.json()["access_token"]
 
         self.access_token = access_token
+        self.refresh_token = refresh_token
         self.last_updated = datetime.now()
@@ -1,7 +1,22 @@
+import hashlib
+import math
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+
 import numpy as np
+import orjson
 import pandas as pd
 import requests
+import requests_cache
+
+try:
+    from numba import njit  # type: ignore
+except ImportError:  # numba is an optional dependency
+    njit = None
 
 
 class DataManager(ABC):
@@ -10,7 +25,9 @@ class DataManager(ABC):
     """
 
     @abstractmethod
-    def get_data(self, access_token: str, n: int) -> None:
+    def get_data(
+        self, access_token: str, n: int, cache_id: str | None, refresh: bool
+    ) -> None:
         """
         Retrieve data from Strava.
         """
@@ -24,123 +41,427 @@ class DataManager(ABC):
         pass
 
 
+def _decode_json(resp: requests.Response) -> Any:
+    """
+    Decode a JSON response body using orjson.
+
+    Falls back to requests' own decoder if orjson can't parse the body (e.g. a
+    non-UTF-8 encoded error response).
+
+    Args:
+        resp: Response returned by the Strava API.
+
+    Returns:
+        The decoded JSON body.
+    """
+    try:
+        return orjson.loads(resp.content)
+    except orjson.JSONDecodeError:
+        return resp.json()
+
+
+def _retry_after_seconds(retry_after: str | None, default: float = 1.0) -> float:
+    """
+    Parse a Retry-After header into the number of seconds to wait.
+
+    Retry-After may be a number of seconds or an HTTP date (RFC 9110).
+
+    Args:
+        retry_after: Value of the Retry-After header, or None if it is missing.
+        default: Seconds to wait if the header is missing or invalid, by default 1.
+
+    Returns:
+        float: Number of seconds to wait.
+    """
+    if retry_after is None:
+        return default
+
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return default
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _speed_mins_per_km_numpy(
+    elapsed_min: np.ndarray, distance_km: np.ndarray
+) -> np.ndarray:
+    """
+    Calculate speed (mins per km) rounded to 2 decimal places.
+
+    Speed is NaN where the distance is zero or missing.
+
+    Args:
+        elapsed_min: Elapsed time of each activity in minutes.
+        distance_km: Distance of each activity in km.
+
+    Returns:
+        np.ndarray: Speed of each activity in mins per km.
+    """
+    # Only divide where distance is positive, leaving NaN elsewhere.
+    speed = np.full(elapsed_min.shape, np.nan, dtype=np.float64)
+    np.divide(elapsed_min, distance_km, out=speed, where=distance_km > 0)
+    np.round(speed, 2, out=speed)
+    return speed
+
+
+def _speed_mins_per_km_numba(
+    elapsed_min: np.ndarray, distance_km: np.ndarray
+) -> np.ndarray:
+    """
+    Calculate speed (mins per km) rounded to 2 decimal places.
+
+    Loop-based equivalent of _speed_mins_per_km_numpy, compiled with numba.
+    """
+    speed = np.empty(elapsed_min.size)
+    for i in range(elapsed_min.size):
+        d = distance_km[i]
+        speed[i] = np.round(elapsed_min[i] / d, 2) if d > 0 else np.nan
+    return speed
+
+
+# Use the compiled loop if numba is installed. fastmath is not enabled as it would
+# allow numba to assume distances are never NaN.
+if njit is not None:
+    _speed_mins_per_km = njit(cache=True)(_speed_mins_per_km_numba)
+else:
+    _speed_mins_per_km = _speed_mins_per_km_numpy
+
+
 class ActivitiesManager(DataManager):
     """
     Responsible for requesting and storing activities data.
     """
 
     ACTIVITIES_URL = "https://www.strava.com/api/v3/athlete/activities"
+    # Activity fields kept from the Strava response, add to these to make other
+    # fields available to stravaboard components.
+    ACTIVITY_FIELDS = (
+        "id",
+        "name",
+        "type",
+        "elapsed_time",
+        "distance",
+        "start_date_local",
+        "moving_time",
+        "total_elevation_gain",
+    )
+    # Text fields stored as Arrow-backed strings.
+    STRING_FIELDS = ("name", "type", "start_date_local")
+    MAX_PER_PAGE = 200  # Strava max per_page
+    MAX_WORKERS = 4  # Maximum number of pages requested concurrently
+    MAX_RETRIES = 3  # Maximum number of retries when rate limited
+    MAX_RETRY_WAIT = 10  # Maximum seconds to wait before a retry
+    CACHE_NAME = ".strava_cache"
+    CACHE_EXPIRE_AFTER = 1800  # seconds
+    # Request header carrying the (hashed) cache_id, used to key cached responses.
+    CACHE_ID_HEADER = "X-Stravaboard-Cache-Id"
+
+    def __init__(
+        self, cache_name: str = CACHE_NAME, cache_backend: str = "sqlite"
+    ) -> None:
+        """
+        Args:
+            cache_name: Name of the response cache (for sqlite, the path of the
+                database file without the .sqlite extension), by default
+                ".strava_cache".
+            cache_backend: requests-cache backend used to store responses (e.g.
+                "sqlite" or "memory"), by default "sqlite".
+        """
+        self.cache_name = cache_name
+        self.cache_backend = cache_backend
+        # Created on first use, so the cache isn't opened on import.
+        self._session: requests_cache.CachedSession | None = None
+
+    def __del__(self) -> None:
+        session = getattr(self, "_session", None)
+        if session is not None:
+            session.close()
+
+    def _get_session(self) -> requests_cache.CachedSession:
+        """
+        Get the session used to request data from Strava, creating it if needed.
+
+        The session reuses one connection to Strava across paginated requests and
+        caches pages (keyed by athlete, URL and params) to stay within Strava's rate
+        limits.
+
+        Returns:
+            requests_cache.CachedSession: The cached session.
+        """
+        if self._session is None:
+            self._session = requests_cache.CachedSession(
+                cache_name=self.cache_name,
+                backend=self.cache_backend,
+                expire_after=self.CACHE_EXPIRE_AFTER,
+                key_fn=self._create_cache_key,
+            )
+        return self._session
 
-    def get_data(self, access_token: str, n: int = 200) -> None:
+    def get_data(
+        self,
+        access_token: str,
+        n: int = 200,
+        cache_id: str | None = None,
+        refresh: bool = False,
+    ) -> None:
         """
         Download Strava activity data.
 
         Queries the Strava API then stores the obtained activity data as a DataFrame.
+        Responses are cached for CACHE_EXPIRE_AFTER seconds, separately for each
+        cache_id.
 
         Args:
             access_token: Strava access token
             n: Maximum number of activities to retrieve, by default 200.
+            cache_id: Stable identifier of the athlete (e.g. their refresh token) used
+                to key cached responses. If None, responses are keyed by the access
+                token, so are only reused while it is valid.
+            refresh: Whether to clear the cache and re-download, by default False.
         """
-        header = {"Authorization": "Bearer " + access_token}
-        per_page = min(n, 200)  # Strava max per_page is typically 200
-        page = 1
-        activities_list = []
-        # activities = requests.get(
-        #     self.ACTIVITIES_URL, headers=header, params=params
-        # ).json()
-        # activities = pd.json_normalize(activities)
+        session = self._get_session()
+        if refresh:
+            session.cache.clear()
+
+        if n < 1:
+            self.data = pd.DataFrame()
+            return
 
-        # self.data = activities
+        # Credentials are passed with each request, rather than set on the shared
+        # session, so concurrent calls for different athletes don't mix.
+        headers = {
+            "Authorization": "Bearer " + access_token,
+            self.CACHE_ID_HEADER: hashlib.sha256(
+                (cache_id or access_token).encode()
+            ).hexdigest(),
+        }
+        # Spread n evenly across the fewest pages possible, so the last page doesn't
+        # fetch (and parse) activities beyond n.
+        n_pages = math.ceil(n / self.MAX_PER_PAGE)
+        per_page = math.ceil(n / n_pages)
         activities_list = []
         try:
-            while len(activities_list) < n:
-                params = {"per_page": per_page, "page": page}
-                resp = requests.get(self.ACTIVITIES_URL, headers=header, params=params)
-                if resp.status_code != 200:
-                    # store response for debugging and stop
-                    try:
-                        err = resp.json()
-                    except Exception:
-                        err = resp.text
-                    print(f"⚠️ Strava API error: status={resp.status_code} body={err}")
-                    break
+            pages = [self._get_page(1, per_page, headers)]
 
-                payload = resp.json()
-                # If Strava returns an error object instead of a list
-                if isinstance(payload, dict) and ("message" in payload or "errors" in payload):
-                    print(f"⚠️ Strava API returned error object: {payload}")
-                    break
+            # Pages are independent, so once the first page is full, request the
+            # remaining pages concurrently.
+            if n_pages > 1 and pages[0] is not None and len(pages[0]) == per_page:
+                executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+                try:
+                    futures = [
+                        executor.submit(self._get_page, page, per_page, headers)
+                        for page in range(2, n_pages + 1)
+                    ]
+                    for future in futures:
+                        pages.append(future.result())
+                        # stop at the first failed or partial page (end of pages)
+                        if pages[-1] is None or len(pages[-1]) < per_page:
+                            break
+                finally:
+                    executor.shutdown(cancel_futures=True)
 
+            for payload in pages:
                 if not payload:
-                    # no more activities
+                    # request failed or no more activities
                     break
-
                 activities_list.extend(payload)
-                # stop if fewer results than per_page (end of pages)
-                if len(payload) < per_page:
-                    break
-                page += 1
 
             # Normalize results into a DataFrame (empty list -> empty DataFrame)
-            activities = pd.json_normalize(activities_list) if activities_list else pd.DataFrame()
+            activities = pd.DataFrame(activities_list[:n])
+            for col in self.STRING_FIELDS:
+                if col in activities.columns:
+                    activities[col] = activities[col].astype("string[pyarrow]")
             self.data = activities
 
         except requests.RequestException as e:
             print(f"⚠️ Network error while fetching activities: {e}")
             self.data = pd.DataFrame()
 
+    def _create_cache_key(self, request: requests_cache.AnyRequest, **kwargs) -> str:
+        """
+        Create a cache key for a request, specific to the request's athlete.
+
+        requests-cache leaves the Authorization header out of its keys, so the
+        (hashed) cache_id sent in the CACHE_ID_HEADER header is added to stop
+        athletes sharing cached activities.
+        """
+        cache_id = request.headers.get(self.CACHE_ID_HEADER, "")
+        return f"{cache_id}:{requests_cache.create_key(request, **kwargs)}"
+
+    def _get_cached_page(
+        self, params: dict, headers: dict
+    ) -> requests_cache.CachedResponse | None:
+        """
+        Get a cached (possibly expired) page of activities for an athlete.
+
+        Args:
+            params: Query parameters of the page request.
+            headers: Headers of the page request, including CACHE_ID_HEADER.
+
+        Returns:
+            requests_cache.CachedResponse | None: The cached page, or None if the page
+                isn't cached.
+        """
+        session = self._get_session()
+        request = session.prepare_request(
+            requests.Request("GET", self.ACTIVITIES_URL, params=params, headers=headers)
+        )
+        return session.cache.get_response(session.cache.create_key(request))
+
+    def _get_page(self, page: int, per_page: int, headers: dict) -> list | None:
+        """
+        Request a single page of activities from Strava.
+
+        If rate limited (status code 429), retries up to MAX_RETRIES times, waiting
+        for the duration given by the Retry-After header. Gives up if that is longer
+        than MAX_RETRY_WAIT seconds. If Strava can't be reached or is unavailable,
+        falls back to the cached page even if it has expired.
+
+        Args:
+            page: Page number to request, starting from 1.
+            per_page: Number of activities per page.
+            headers: Request headers, including the Authorization and CACHE_ID_HEADER
+                headers.
+
+        Returns:
+            list | None: The activities on the page, keeping only ACTIVITY_FIELDS, or
+                None if the request failed.
+        """
+        params = {"per_page": per_page, "page": page}
+        session = self._get_session()
+        try:
+            resp = session.get(
+                self.ACTIVITIES_URL, params=params, headers=headers, timeout=10
+            )
+            for _ in range(self.MAX_RETRIES):
+                if resp.status_code != 429:
+                    break
+                wait = _retry_after_seconds(resp.headers.get("Retry-After"))
+                if wait > self.MAX_RETRY_WAIT:
+                    break
+                time.sleep(wait)
+                resp = session.get(
+                    self.ACTIVITIES_URL, params=params, headers=headers, timeout=10
+                )
+        except requests.RequestException:
+            cached = self._get_cached_page(params, headers)
+            if cached is None:
+                raise
+            resp = cached
+
+        # Don't fall back to the cache if the credentials are rejected (401/403), so
+        # revoked or invalid tokens aren't served stale data.
+        if resp.status_code == 429 or resp.status_code >= 500:
+            cached = self._get_cached_page(params, headers)
+            if cached is not None:
+                resp = cached
+
+        if resp.status_code != 200:
+            # store response for debugging and stop
+            try:
+                err = _decode_json(resp)
+            except Exception:
+                err = resp.text
+            print(f"⚠️ Strava API error: status={resp.status_code} body={err}")
+            return None
+
+        payload = _decode_json(resp)
+        # If Strava returns an error object instead of a list
+        if isinstance(payload, dict) and ("message" in payload or "errors" in payload):
+            print(f"⚠️ Strava API returned error object: {payload}")
+            return None
+
+        # Keep only the fields used downstream, so the raw page can be discarded
+        return [{k: a[k] for k in self.ACTIVITY_FIELDS if k in a} for a in payload]
 
     def tidy_data(self) -> None:
         """
         Tidy the activity data.
-    
+
         Convert speed, distance, time and date columns to human-interpretable units.
         Safely handles missing fields from the Strava API.
         """
-    
+
         activities = self.data
-    
+
         # Ensure it's a DataFrame and not empty
         if not isinstance(activities, pd.DataFrame) or activities.empty:
             print("⚠️ No activity data to tidy.")
             self.data = pd.DataFrame()
             return
-    
-        # Create derived columns only if source data exists
-        if "elapsed_time" in activities.columns:
-            activities["elapsed_min"] = (activities["elapsed_time"] / 60).round(2)
+
+        # Create derived columns only if source data exists. Arithmetic is done on
+        # the underlying arrays to avoid creating intermediate Series, and the derived
+        # columns are added to the DataFrame in one go.
+        new_cols: dict[str, Any] = {}
+        columns = set(activities.columns)
+        has_elapsed_time = "elapsed_time" in columns
+        has_distance = "distance" in columns
+        has_start_date = "start_date_local" in columns
+
+        if has_elapsed_time:
+            elapsed_min = np.round(
+                activities["elapsed_time"].to_numpy(dtype=np.float64) / 60.0, 2
+            )
         else:
             print("⚠️ Missing 'elapsed_time' column.")
-            activities["elapsed_min"] = None
-        
-    
-        if "distance" in activities.columns:
-            activities["distance_km"] = (activities["distance"] / 1000).round(2)
+            elapsed_min = None
+        new_cols["elapsed_min"] = elapsed_min
+
+        if has_distance:
+            distance_km = np.round(
+                activities["distance"].to_numpy(dtype=np.float64) / 1000.0, 2
+            )
         else:
             print("⚠️ Missing 'distance' column.")
-            activities["distance_km"] = None
-    
+            distance_km = None
+        new_cols["distance_km"] = distance_km
 
-        if {"elapsed_min", "distance_km"}.issubset(activities.columns):
-            activities["speed_mins_per_km"] = (
-                activities["elapsed_min"] / activities["distance_km"]
-            ).replace([np.inf, -np.inf], np.nan).round(2)
+        if has_elapsed_time and has_distance:
+            new_cols["speed_mins_per_km"] = _speed_mins_per_km(elapsed_min, distance_km)
         else:
-            activities["speed_mins_per_km"] = np.nan
-    
+            new_cols["speed_mins_per_km"] = np.nan
+
         # Parse and format dates
-        if "start_date_local" in activities.columns:
-            activities["date"] = (
-                activities["start_date_local"]
-                .astype(str)
-                .str.replace("T.*", "", regex=True)
-            )
-            activities["date"] = pd.to_datetime(
-                activities["date"], errors="coerce", infer_datetime_format=True
-            )
+        if has_start_date:
+            # Strava dates are ISO-8601 (YYYY-MM-DDTHH:MM:SSZ), so the date is always
+            # the first 10 characters. String-typed columns (as stored by get_data) are
+            # sliced with Arrow's string kernels rather than element by element.
+            start_dates = activities["start_date_local"]
+            if isinstance(start_dates.dtype, pd.StringDtype):
+                dates = start_dates.str.slice(0, 10)
+            else:
+                # Other non-object columns (e.g. datetime64) are converted to strings
+                # first, object columns are converted element by element below.
+                if start_dates.dtype != object:
+                    start_dates = start_dates.astype(str)
+                dates = [
+                    None if pd.isna(x) else str(x)[:10]
+                    for x in start_dates.to_numpy(dtype=object)
+                ]
+            new_cols["date"] = pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce")
         else:
             print("⚠️ Missing 'start_date_local' column.")
-            activities["date"] = None
-    
-        self.data = activities
+            new_cols["date"] = None
 
+        # Replace any existing derived columns (e.g. if the data was already tidied)
+        activities = pd.concat(
+            [
+                activities.drop(columns=list(new_cols), errors="ignore"),
+                pd.DataFrame(new_cols, index=activities.index),
+            ],
+            axis=1,
+            copy=False,
+        )
+
+        self.data = activities
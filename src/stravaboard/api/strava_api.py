@@ -24,12 +24,13 @@ class StravaAPI:
             refresh_token,
         )
 
-    def get(self, data_type: str) -> pd.DataFrame:
+    def get(self, data_type: str, refresh: bool = False) -> pd.DataFrame:
         """
         Download and tidy Strava data.
 
         Args:
             data_type: Type of Strava data to download.
+            refresh: Whether to ignore cached data and re-download, by default False.
 
         Returns:
             pd.DataFrame: The tidied Strava data.
@@ -39,7 +40,13 @@ class StravaAPI:
             raise InvalidDataTypeError(f"data_type must be one of: {available_types}")
 
         data_manager = self.DATA_TYPES[data_type]
-        data_manager.get_data(self.access_token_manager.access_token)
+        # The refresh token identifies the athlete across access tokens, so their
+        # cached data can be reused.
+        data_manager.get_data(
+            self.access_token_manager.access_token,
+            cache_id=self.access_token_manager.refresh_token,
+            refresh=refresh,
+        )
         data_manager.tidy_data()
 
         return data_manager.data
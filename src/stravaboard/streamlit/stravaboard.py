@@ -16,7 +16,9 @@ class Stravaboard:
             refresh_token=refresh_token,
         )
 
-        self.activities = strava_api.get("activities")
+        # Re-download activities, rather than using the cache, when requested.
+        refresh = st.sidebar.button("Refresh activities")
+        self.activities = strava_api.get("activities", refresh=refresh)
 
     def display(self, components: list[StravaboardComponent]) -> None:
         """
@@ -1,10 +1,26 @@
+import io
+import json
+import math
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
 
+import numpy as np
 import pandas as pd
 import pytest
+import requests
+import urllib3
 
 from stravaboard.api.access_token import AccessTokenManager
-from stravaboard.api.data_manager import ActivitiesManager
+from stravaboard.api.data_manager import (
+    ActivitiesManager,
+    _speed_mins_per_km,
+    _speed_mins_per_km_numpy,
+)
 
 
 @pytest.mark.skipif(
@@ -14,7 +30,7 @@ from stravaboard.api.data_manager import ActivitiesManager
 def test_ActivitiesManager_retrieves_activities_correctly(
     access_token_manager: AccessTokenManager,
 ) -> None:
-    am = ActivitiesManager()
+    am = ActivitiesManager(cache_backend="memory")
 
     assert am.ACTIVITIES_URL == "https://www.strava.com/api/v3/athlete/activities"
 
@@ -23,3 +39,319 @@ def test_ActivitiesManager_retrieves_activities_correctly(
 
     assert isinstance(am.data, pd.DataFrame)
     assert am.data.shape[0] == 50
+
+
+START_DATES = ["2024-01-02T07:30:00Z", "2024-02-10T18:05:12Z", "2024-03-31T23:59:59Z"]
+
+
+@pytest.mark.parametrize(
+    "start_date_local",
+    [
+        pd.Series(START_DATES, dtype=object),
+        pd.Series(START_DATES, dtype="string[pyarrow]"),
+        pd.Series(list(pd.to_datetime(START_DATES).tz_localize(None)), dtype=object),
+        pd.Series(pd.to_datetime(START_DATES).tz_localize(None)),
+    ],
+)
+def test_ActivitiesManager_tidies_activities_correctly(
+    start_date_local: pd.Series,
+) -> None:
+    am = ActivitiesManager(cache_backend="memory")
+    am.data = pd.DataFrame(
+        {
+            "elapsed_time": [1800, 600, 300],
+            "distance": [5000.0, 0.0, None],
+            "start_date_local": start_date_local,
+        }
+    )
+
+    am.tidy_data()
+
+    assert am.data["elapsed_min"].tolist() == [30.0, 10.0, 5.0]
+    assert am.data["distance_km"].iloc[:2].tolist() == [5.0, 0.0]
+    assert am.data["speed_mins_per_km"].iloc[0] == 6.0
+    assert am.data["speed_mins_per_km"].iloc[1:].isna().all()
+    assert am.data["date"].tolist() == list(
+        pd.to_datetime(["2024-01-02", "2024-02-10", "2024-03-31"])
+    )
+
+
+def test_ActivitiesManager_tidy_data_keeps_full_precision() -> None:
+    am = ActivitiesManager(cache_backend="memory")
+    am.data = pd.DataFrame({"elapsed_time": [1828.2], "distance": [5370.0]})
+
+    am.tidy_data()
+
+    for col, value in [
+        ("elapsed_min", 30.47),
+        ("distance_km", 5.37),
+        ("speed_mins_per_km", 5.67),
+    ]:
+        assert am.data[col].dtype == np.float64
+        assert am.data[col].tolist() == [value]
+
+
+def test_ActivitiesManager_tidy_data_replaces_derived_columns() -> None:
+    am = ActivitiesManager(cache_backend="memory")
+    am.data = pd.DataFrame(
+        {
+            "elapsed_time": [1800],
+            "distance": [5000.0],
+            "start_date_local": ["2024-01-02T07:30:00Z"],
+        }
+    )
+
+    am.tidy_data()
+    am.tidy_data()
+
+    assert am.data.columns.is_unique
+    assert am.data["elapsed_min"].tolist() == [30.0]
+    assert am.data["date"].tolist() == [pd.Timestamp("2024-01-02")]
+
+
+class FakeResponse:
+    def __init__(
+        self, payload: list | dict, status_code: int = 200, headers: dict | None = None
+    ) -> None:
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = json.dumps(payload).encode()
+
+
+@pytest.mark.parametrize("n", [1, 200, 250, 400, 401])
+def test_ActivitiesManager_get_data_paginates_up_to_n(
+    monkeypatch: pytest.MonkeyPatch, n: int
+) -> None:
+    activities = [{"id": i} for i in range(1000)]
+    requested_pages = []
+
+    def fake_get(url: str, params: dict, headers: dict, timeout: int) -> FakeResponse:
+        requested_pages.append(params["page"])
+        start = (params["page"] - 1) * params["per_page"]
+        return FakeResponse(activities[start : start + params["per_page"]])
+
+    am = ActivitiesManager(cache_backend="memory")
+    monkeypatch.setattr(am._get_session(), "get", fake_get)
+    am.get_data("token", n=n)
+
+    assert am.data["id"].tolist() == list(range(n))
+    assert len(requested_pages) == math.ceil(n / 200)
+
+
+def test_ActivitiesManager_get_data_stops_at_last_page(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    activities = [{"id": i, "name": "Run", "map": {"id": f"a{i}"}} for i in range(250)]
+
+    def fake_get(url: str, params: dict, headers: dict, timeout: int) -> FakeResponse:
+        start = (params["page"] - 1) * params["per_page"]
+        return FakeResponse(activities[start : start + params["per_page"]])
+
+    am = ActivitiesManager(cache_backend="memory")
+    monkeypatch.setattr(am._get_session(), "get", fake_get)
+    am.get_data("token", n=1000)
+
+    assert am.data.columns.tolist() == ["id", "name"]
+    assert am.data["name"].dtype == "string[pyarrow]"
+    assert am.data["id"].tolist() == list(range(250))
+
+
+def test_ActivitiesManager_get_data_stops_at_failed_page(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    activities = [{"id": i} for i in range(600)]
+
+    def fake_get(url: str, params: dict, headers: dict, timeout: int) -> FakeResponse:
+        if params["page"] == 2:
+            return FakeResponse({"message": "Internal Server Error"}, status_code=500)
+        start = (params["page"] - 1) * params["per_page"]
+        return FakeResponse(activities[start : start + params["per_page"]])
+
+    am = ActivitiesManager(cache_backend="memory")
+    monkeypatch.setattr(am._get_session(), "get", fake_get)
+    am.get_data("token", n=600)
+
+    assert am.data["id"].tolist() == list(range(200))
+
+
+@pytest.mark.parametrize(
+    "retry_after, expected_sleep",
+    [
+        ("2", 2.0),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+        ("not a date", 1.0),
+        (None, 1.0),
+    ],
+)
+def test_ActivitiesManager_get_data_retries_when_rate_limited(
+    monkeypatch: pytest.MonkeyPatch, retry_after: str | None, expected_sleep: float
+) -> None:
+    headers = {} if retry_after is None else {"Retry-After": retry_after}
+    responses = [
+        FakeResponse({"message": "Rate Limit Exceeded"}, 429, headers),
+        FakeResponse([{"id": 1}]),
+    ]
+    sleeps: list[float] = []
+
+    def fake_get(url: str, params: dict, headers: dict, timeout: int) -> FakeResponse:
+        return responses.pop(0)
+
+    am = ActivitiesManager(cache_backend="memory")
+    monkeypatch.setattr(am._get_session(), "get", fake_get)
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    am.get_data("token", n=1)
+
+    assert am.data["id"].tolist() == [1]
+    assert sleeps == [expected_sleep]
+
+
+def test_ActivitiesManager_get_data_gives_up_on_long_rate_limit(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    sleeps: list[float] = []
+    requests_sent = []
+
+    def fake_get(url: str, params: dict, headers: dict, timeout: int) -> FakeResponse:
+        requests_sent.append(params["page"])
+        return FakeResponse(
+            {"message": "Rate Limit Exceeded"}, 429, {"Retry-After": "900"}
+        )
+
+    am = ActivitiesManager(cache_backend="memory")
+    monkeypatch.setattr(am._get_session(), "get", fake_get)
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    am.get_data("token", n=1)
+
+    assert am.data.empty
+    assert requests_sent == [1]
+    assert sleeps == []
+
+
+def test_speed_mins_per_km_numba_matches_numpy() -> None:
+    pytest.importorskip("numba")
+
+    elapsed_min = np.array([30.0, 10.0, 5.0, 12.34])
+    distance_km = np.array([5.0, 0.0, np.nan, 2.1])
+
+    np.testing.assert_array_equal(
+        _speed_mins_per_km(elapsed_min, distance_km),
+        _speed_mins_per_km_numpy(elapsed_min, distance_km),
+    )
+
+
+def test_ActivitiesManager_creates_cache_on_first_use(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.chdir(tmp_path)
+
+    am = ActivitiesManager()
+    assert list(tmp_path.iterdir()) == []
+
+    am = ActivitiesManager(cache_name=str(tmp_path / "cache"))
+    am.get_data("token", n=0)
+    assert (tmp_path / "cache.sqlite").exists()
+
+
+def make_response(
+    request: requests.PreparedRequest, status_code: int, payload: list | dict
+) -> requests.Response:
+    content = json.dumps(payload).encode()
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp._content = content
+    resp.headers["Content-Type"] = "application/json"
+    resp.raw = urllib3.HTTPResponse(
+        body=io.BytesIO(content), status=status_code, preload_content=False
+    )
+    resp.request = request
+    resp.url = request.url or ""
+    return resp
+
+
+def test_ActivitiesManager_caches_activities_per_athlete(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    sent = []
+
+    def fake_send(
+        self: requests.Session, request: requests.PreparedRequest, **kwargs
+    ) -> requests.Response:
+        sent.append(request.headers["Authorization"])
+        return make_response(request, 200, [{"id": len(sent)}])
+
+    monkeypatch.setattr(requests.Session, "send", fake_send)
+    am = ActivitiesManager(cache_backend="memory")
+
+    am.get_data("token-1", n=1, cache_id="alice")
+    am.get_data("token-2", n=1, cache_id="alice")
+    assert am.data["id"].tolist() == [1]
+
+    am.get_data("token-1", n=1, cache_id="bob")
+    assert am.data["id"].tolist() == [2]
+    assert sent == ["Bearer token-1", "Bearer token-1"]
+
+
+@pytest.mark.parametrize("status_code, expected_ids", [(500, [1]), (401, [])])
+def test_ActivitiesManager_only_uses_expired_cache_if_strava_unavailable(
+    monkeypatch: pytest.MonkeyPatch, status_code: int, expected_ids: list
+) -> None:
+    statuses = [200, status_code]
+
+    def fake_send(
+        self: requests.Session, request: requests.PreparedRequest, **kwargs
+    ) -> requests.Response:
+        return make_response(request, statuses.pop(0), [{"id": 1}])
+
+    monkeypatch.setattr(requests.Session, "send", fake_send)
+    am = ActivitiesManager(cache_backend="memory")
+
+    am.get_data("token", n=1, cache_id="alice")
+    am._get_session().cache.reset_expiration(timedelta(seconds=-1))
+    am.get_data("token", n=1, cache_id="alice")
+
+    assert am.data.get("id", pd.Series()).tolist() == expected_ids
+
+
+def test_ActivitiesManager_keeps_concurrent_athletes_separate(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Hold both athletes' first pages until both calls are in flight.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_send(
+        self: requests.Session, request: requests.PreparedRequest, **kwargs
+    ) -> requests.Response:
+        query = parse_qs(urlparse(request.url).query)
+        page, per_page = int(query["page"][0]), int(query["per_page"][0])
+        if page == 1:
+            barrier.wait()
+        athlete = request.headers["Authorization"].removeprefix("Bearer ")
+        start = (page - 1) * per_page
+        activities = [
+            {"id": i, "name": athlete} for i in range(start, start + per_page)
+        ]
+        return make_response(request, 200, activities)
+
+    monkeypatch.setattr(requests.Session, "send", fake_send)
+    am = ActivitiesManager(cache_backend="memory")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(am.get_data, athlete, n=400, cache_id=athlete)
+            for athlete in ["alice", "bob"]
+        ]
+        for future in futures:
+            future.result()
+
+    # Each athlete's cached pages must only contain their own activities.
+    def offline_send(
+        self: requests.Session, request: requests.PreparedRequest, **kwargs
+    ) -> requests.Response:
+        raise requests.ConnectionError("Strava is unreachable")
+
+    monkeypatch.setattr(requests.Session, "send", offline_send)
+    for athlete in ["alice", "bob"]:
+        am.get_data("new-token", n=400, cache_id=athlete)
+
+        assert am.data["id"].tolist() == list(range(400))
+        assert set(am.data["name"]) == {athlete}